@@ -1,7 +1,6 @@
 """Script to check database contents."""
 
 import os
-import json
 from datetime import datetime
 from dotenv import load_dotenv
 from reddit_agent.database import Database
@@ -16,9 +15,8 @@ def main():
     
     # Get all subreddits
     print("\n=== Subreddits in Database ===")
-    subreddits = db.get_all_subreddits()
-    print(f"Total subreddits: {len(subreddits)}")
-    for subreddit in subreddits:
+    print(f"Total subreddits: {db.count_subreddits()}")
+    for subreddit in db.iter_subreddits():
         print(f"\nSubreddit: r/{subreddit.name}")
         print(f"Title: {subreddit.title}")
         print(f"Description: {subreddit.description[:100]}..." if subreddit.description else "No description")
@@ -27,14 +25,13 @@ def main():
     
     # Get all market insights
     print("\n=== Market Insights in Database ===")
-    insights = db.get_all_market_insights()
-    print(f"Total insights: {len(insights)}")
-    for insight in insights:
+    print(f"Total insights: {db.count_market_insights()}")
+    for insight in db.iter_market_insights():
         print(f"\nInsight ID: {insight.id}")
         print(f"Subreddit: r/{insight.subreddit_name}")
         print(f"Market: {insight.target_market}")
         print(f"Created: {insight.created_at}")
-        print(f"Needs Found: {len(json.loads(insight.needs_found))}")
+        print(f"Needs Found: {insight.n_needs}")
         print("-" * 50)
 
 if __name__ == "__main__":
@@ -1,42 +1,51 @@
 """Main script to run the Reddit AI Agent."""
 
 import os
+import re
 import json
 import logging
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 import argparse
-from typing import List, Dict
-import praw
+import asyncio
+from typing import AsyncIterator, List, Dict, Tuple
+import asyncpraw
 from datetime import datetime
 
 from reddit_agent import RedditAIAgent
 from reddit_agent.llm import LLMAnalyzer
+from reddit_agent.ratelimit import AsyncTokenBucket
 
 # Set up logging
 logging.basicConfig(level=logging.INFO,
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+SEARCHABLE_COLUMNS = ['name', 'title', 'description', 'topic']
+
+def load_subreddits(csv_path: str) -> pd.DataFrame:
+    """Load the subreddit CSV with Arrow-backed string columns for fast searching."""
+    df = pd.read_csv(csv_path)
+    return df.astype({col: "string[pyarrow]" for col in SEARCHABLE_COLUMNS if col in df.columns})
+
 def search_subreddits(df: pd.DataFrame, query: str) -> pd.DataFrame:
     """Search for subreddits in the CSV file."""
-    # Convert all searchable columns to string and lowercase for case-insensitive search
-    searchable_columns = ['name', 'title', 'description', 'topic']
-    df_search = df.copy()
-    
-    for col in searchable_columns:
-        if col in df_search.columns:
-            df_search[col] = df_search[col].fillna('').astype(str).str.lower()
-    
-    # Split query into keywords
-    keywords = query.lower().split()
+    # Match any query keyword, case-insensitively, with a single pattern
+    keywords = query.split()
+    if not keywords:
+        return df.iloc[0:0].copy()
+    pattern = '|'.join(map(re.escape, keywords))
     
     # Search across multiple columns
-    mask = pd.Series([False] * len(df_search))
-    for col in searchable_columns:
-        if col in df_search.columns:
-            for keyword in keywords:
-                mask = mask | df_search[col].str.contains(keyword, na=False)
+    mask = np.zeros(len(df), dtype=bool)
+    for col in SEARCHABLE_COLUMNS:
+        if col in df.columns:
+            column = df[col]
+            # Columns from load_subreddits are already strings; convert anything else
+            if not isinstance(column.dtype, pd.StringDtype):
+                column = column.fillna('').astype(str)
+            mask |= column.str.contains(pattern, case=False, regex=True, na=False).to_numpy(dtype=bool)
     
     return df.loc[mask].copy()  # Return original dataframe rows that match
 
@@ -52,10 +61,52 @@ def save_insights(insights: Dict, subreddit: str):
     except Exception as e:
         logger.error(f"Error saving insights: {str(e)}")
 
-def analyze_subreddit(reddit: praw.Reddit, subreddit_name: str, post_limit: int, llm: LLMAnalyzer) -> Dict:
-    """Analyze a subreddit for market insights."""
+# Shared by all tasks to stay under Reddit's 60 requests/minute limit
+reddit_bucket = AsyncTokenBucket(rate=1.0, capacity=60)
+
+# Items asyncpraw fetches per listing request
+LISTING_PAGE_SIZE = 100
+
+async def rate_limited(listing: AsyncIterator, page_size: int = LISTING_PAGE_SIZE) -> AsyncIterator:
+    """Yield the items of an asyncpraw listing, taking a reddit_bucket token before each page request."""
+    count = 0
+    while True:
+        if count % page_size == 0:
+            await reddit_bucket.acquire()
+        try:
+            item = await listing.__anext__()
+        except StopAsyncIteration:
+            return
+        count += 1
+        yield item
+
+async def fetch_posts(subreddit: asyncpraw.models.Subreddit, category: str, limit: int) -> List[asyncpraw.models.Submission]:
+    """Fetch non-stickied posts from one listing category of a subreddit."""
+    return [post async for post in rate_limited(getattr(subreddit, category)(limit=limit)) if not post.stickied]
+
+async def build_post_text(post: asyncpraw.models.Submission, semaphore: asyncio.Semaphore) -> str:
+    """Combine post title, content, and top comments into a single text."""
+    text = f"Title: {post.title}\n\nContent: {post.selftext}\n\n"
+    top_comments = []
+    # Skip the comment fetch entirely for threads without comments
+    if post.num_comments > 0:
+        async with semaphore:
+            await reddit_bucket.acquire()
+            await post.load()
+            await post.comments.replace_more(limit=0)
+        top_comments = [comment.body for comment in post.comments.list()[:3]]
+    text += "Top Comments:\n" + "\n".join(top_comments)
+    return text
+
+async def analyze_subreddit(reddit: asyncpraw.Reddit, subreddit_name: str, post_limit: int, llm: LLMAnalyzer,
+                            semaphore: asyncio.Semaphore) -> Dict:
+    """
+    Analyze a subreddit for market insights.
+    The semaphore bounds how many posts have their comments fetched at once.
+    """
     try:
-        subreddit = reddit.subreddit(subreddit_name)
+        await reddit_bucket.acquire()
+        subreddit = await reddit.subreddit(subreddit_name, fetch=True)
         insights = {
             'subreddit': subreddit_name,
             'title': subreddit.title,
@@ -65,47 +116,132 @@ def analyze_subreddit(reddit: praw.Reddit, subreddit_name: str, post_limit: int,
             'opportunities': []
         }
         
-        # Analyze different post categories
+        # Gather post texts from the different categories concurrently
         categories = ['hot', 'new', 'top']
-        posts_analyzed = 0
+        logger.info(f"Gathering {', '.join(categories)} posts in r/{subreddit_name}")
         
-        for category in categories:
-            logger.info(f"Analyzing {category} posts in r/{subreddit_name}")
-            post_list = getattr(subreddit, category)(limit=post_limit // len(categories))
-            
-            for post in post_list:
-                # Skip stickied posts
-                if post.stickied:
-                    continue
-                
-                # Combine post title, content, and top comments
-                text = f"Title: {post.title}\n\nContent: {post.selftext}\n\n"
-                post.comments.replace_more(limit=0)
-                top_comments = [comment.body for comment in post.comments.list()[:3]]
-                text += "Top Comments:\n" + "\n".join(top_comments)
-                
-                # Analyze for market needs
-                is_need, confidence, details = llm.analyze_market_need(text)
-                
-                if is_need and confidence > 0.6:
-                    need_info = {
-                        'url': f"https://reddit.com{post.permalink}",
-                        'title': post.title,
-                        'score': post.score,
-                        'confidence': confidence,
-                        **details
-                    }
-                    insights['needs_found'].append(need_info)
-                
-                posts_analyzed += 1
-                
-        logger.info(f"Analyzed {posts_analyzed} posts in r/{subreddit_name}")
+        category_posts = await asyncio.gather(*[
+            fetch_posts(subreddit, category, post_limit // len(categories)) for category in categories
+        ])
+        posts = [post for category in category_posts for post in category]
+        
+        texts: List[str] = list(await asyncio.gather(*[
+            asyncio.create_task(build_post_text(post, semaphore)) for post in posts
+        ]))
+        post_meta: List[Tuple[str, str, int]] = [
+            (f"https://reddit.com{post.permalink}", post.title, post.score) for post in posts
+        ]
+        
+        # Analyze all gathered posts for market needs in batched LLM calls
+        logger.info(f"Analyzing {len(texts)} posts in r/{subreddit_name}")
+        results = await llm.analyze_market_need_batch_async(texts)
+        
+        for (url, title, score), (is_need, confidence, details) in zip(post_meta, results):
+            if is_need and confidence > 0.6:
+                need_info = {
+                    'url': url,
+                    'title': title,
+                    'score': score,
+                    'confidence': confidence,
+                    **details
+                }
+                insights['needs_found'].append(need_info)
+        
+        logger.info(f"Analyzed {len(texts)} posts in r/{subreddit_name}")
         return insights
         
     except Exception as e:
         logger.error(f"Error analyzing subreddit r/{subreddit_name}: {str(e)}")
         return None
 
+async def _relevant_in_chunk(chunk: List[asyncpraw.models.Subreddit], market: str, llm: LLMAnalyzer) -> List[str]:
+    """Return names of the subreddits in chunk that the LLM judges relevant, in one batched call."""
+    verdicts = await llm.is_relevant_subreddit_batch_async(
+        [subreddit.description or subreddit.title for subreddit in chunk],
+        market
+    )
+    
+    relevant = []
+    for subreddit, (is_relevant, confidence, reason) in zip(chunk, verdicts):
+        logger.info(f"Subreddit r/{subreddit.display_name}: Relevant={is_relevant}, Confidence={confidence:.2f}")
+        logger.info(f"Reason: {reason}")
+        
+        if is_relevant and confidence > 0.3:  # Lower threshold for inclusivity
+            relevant.append(subreddit.display_name)
+    return relevant
+
+async def find_relevant_subreddits(reddit: asyncpraw.Reddit, query: str, market: str, llm: LLMAnalyzer,
+                                   chunk_size: int = 10) -> AsyncIterator[str]:
+    """
+    Lazily yield names of searched subreddits that the LLM judges relevant to the market.
+    Search results are checked in chunks with one batched LLM call each, and further
+    result pages are only fetched if the caller keeps consuming the generator.
+    """
+    chunk = []
+    async for subreddit in rate_limited(reddit.subreddits.search(query, limit=None)):
+        chunk.append(subreddit)
+        if len(chunk) == chunk_size:
+            for name in await _relevant_in_chunk(chunk, market, llm):
+                yield name
+            chunk = []
+    if chunk:
+        for name in await _relevant_in_chunk(chunk, market, llm):
+            yield name
+
+async def _take(iterator: AsyncIterator[str], n: int) -> List[str]:
+    """Return up to the next n items of an async iterator."""
+    items = []
+    async for item in iterator:
+        items.append(item)
+        if len(items) == n:
+            break
+    return items
+
+async def research_market(args: argparse.Namespace) -> Tuple[List[Dict], int]:
+    """Find and analyze relevant subreddits, returning their insights and total needs found."""
+    analyzed_subreddits = []
+    total_needs = 0
+    
+    # Initialize Reddit client
+    async with asyncpraw.Reddit(
+        client_id=os.getenv('REDDIT_CLIENT_ID'),
+        client_secret=os.getenv('REDDIT_CLIENT_SECRET'),
+        user_agent=os.getenv('REDDIT_USER_AGENT'),
+        username=os.getenv('REDDIT_USERNAME')
+    ) as reddit:
+        # Initialize LLM analyzer
+        async with LLMAnalyzer() as llm:
+            post_semaphore = asyncio.Semaphore(8)
+            subreddit_semaphore = asyncio.Semaphore(4)
+            
+            async def analyze(name: str) -> Dict:
+                async with subreddit_semaphore:
+                    return await analyze_subreddit(reddit, name, args.posts, llm, post_semaphore)
+            
+            # Search for relevant subreddits
+            logger.info(f"Searching for subreddits matching: {args.search}")
+            
+            try:
+                relevant = find_relevant_subreddits(reddit, args.search, args.market, llm)
+                
+                # Analyze relevant subreddits concurrently, in waves sized to the remaining limit
+                while len(analyzed_subreddits) < args.limit:
+                    wave = await _take(relevant, args.limit - len(analyzed_subreddits))
+                    if not wave:
+                        break
+                    
+                    wave_insights = await asyncio.gather(*[analyze(name) for name in wave])
+                    for name, insights in zip(wave, wave_insights):
+                        if insights and insights.get('needs_found'):
+                            analyzed_subreddits.append(insights)
+                            total_needs += len(insights['needs_found'])
+                            save_insights(insights, name)
+            
+            except Exception as e:
+                logger.error(f"Error during subreddit analysis: {str(e)}")
+    
+    return analyzed_subreddits, total_needs
+
 def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Reddit Market Research Tool')
@@ -118,47 +254,8 @@ def main():
     # Load environment variables
     load_dotenv()
     
-    # Initialize Reddit client
-    reddit = praw.Reddit(
-        client_id=os.getenv('REDDIT_CLIENT_ID'),
-        client_secret=os.getenv('REDDIT_CLIENT_SECRET'),
-        user_agent=os.getenv('REDDIT_USER_AGENT'),
-        username=os.getenv('REDDIT_USERNAME')
-    )
-    
-    # Initialize LLM analyzer
-    llm = LLMAnalyzer()
-    
-    # Search for relevant subreddits
-    logger.info(f"Searching for subreddits matching: {args.search}")
-    
     # Get list of subreddits to analyze
-    analyzed_subreddits = []
-    total_needs = 0
-    
-    try:
-        for subreddit in reddit.subreddits.search(args.search, limit=args.limit * 2):
-            if len(analyzed_subreddits) >= args.limit:
-                break
-                
-            # Check if subreddit is relevant
-            is_relevant, confidence, reason = llm.is_relevant_subreddit(
-                subreddit.description or subreddit.title,
-                args.market
-            )
-            
-            logger.info(f"Subreddit r/{subreddit.display_name}: Relevant={is_relevant}, Confidence={confidence:.2f}")
-            logger.info(f"Reason: {reason}")
-            
-            if is_relevant and confidence > 0.3:  # Lower threshold for inclusivity
-                insights = analyze_subreddit(reddit, subreddit.display_name, args.posts, llm)
-                if insights and insights.get('needs_found'):
-                    analyzed_subreddits.append(insights)
-                    total_needs += len(insights['needs_found'])
-                    save_insights(insights, subreddit.display_name)
-    
-    except Exception as e:
-        logger.error(f"Error during subreddit analysis: {str(e)}")
+    analyzed_subreddits, total_needs = asyncio.run(research_market(args))
     
     # Print summary
     print("\nMarket Research Summary:")
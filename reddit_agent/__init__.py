@@ -8,7 +8,7 @@ A utility-based learning agent for Reddit analysis that combines multiple agent
 """
 
 from .agent import RedditAIAgent
-from .models import UtilityMetrics
+from .models import UtilityMetrics, UtilityMetricsBatch
 
 __version__ = "0.1.0"
-__all__ = ["RedditAIAgent", "UtilityMetrics"]
+__all__ = ["RedditAIAgent", "UtilityMetrics", "UtilityMetricsBatch"]
@@ -0,0 +1,28 @@
+"""Numeric kernels for the Reddit AI Agent, JIT-compiled with Numba when available."""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:  # Run the kernels as plain NumPy code without Numba
+    HAVE_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that returns the function unchanged."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+@njit(cache=True, fastmath=True)
+def _ema_update(old_vec: np.ndarray, new_vec: np.ndarray, lr: float) -> np.ndarray:
+    """Exponential moving average blend of old_vec towards new_vec."""
+    return (1.0 - lr) * old_vec + lr * new_vec
+
+@njit(parallel=True, cache=True)  # No fastmath, so results match the NumPy path exactly
+def utility_kernel(e: np.ndarray, s: np.ndarray, r: np.ndarray, n: np.ndarray,
+                   we: float, ws: float, wr: float, wn: float, out: np.ndarray):
+    """Write the weighted utility of each row of the metric columns into out, in parallel over rows."""
+    for i in prange(e.size):
+        out[i] = we * e[i] + ws * s[i] + wr * r[i] + wn * n[i]
@@ -3,18 +3,25 @@
 import os
 import json
 import logging
+import sqlite3
+import time
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 from collections import defaultdict
+import numpy as np
 import praw
 import prawcore
 
-from .models import UtilityMetrics
+from .models import UtilityMetrics, UtilityMetricsBatch
 from .database import Database
 from .analysis import ContentAnalyzer
+from ._kernels import _ema_update
 
 logger = logging.getLogger(__name__)
 
+# Numeric per-subreddit model metrics, in the column order of RedditAIAgent._metrics
+MODEL_METRICS = ('avg_engagement', 'avg_sentiment', 'avg_relevance', 'avg_novelty')
+
 class RedditAIAgent:
     """
     A utility-based learning agent for Reddit analysis that combines multiple agent types:
@@ -47,9 +54,12 @@ class RedditAIAgent:
         self.db = Database(db_path)
         self.analyzer = ContentAnalyzer()
         
-        # Internal state for model-based reasoning
-        self.subreddit_models = defaultdict(dict)
+        # Internal state for model-based reasoning: one row of MODEL_METRICS per subreddit
+        self._sub_idx: Dict[str, int] = {}
+        self._metrics = np.zeros((16, len(MODEL_METRICS)), dtype=np.float32)
+        self._model_extras = defaultdict(dict)  # Non-numeric model data such as topics
         self.learning_rate = float(os.getenv('LEARNING_RATE', '0.1'))
+        self.store_batch_size = 100  # Submissions queued before a bulk insert
         self.utility_weights = {
             'engagement': float(os.getenv('WEIGHT_ENGAGEMENT', '0.4')),
             'sentiment': float(os.getenv('WEIGHT_SENTIMENT', '0.2')),
@@ -57,6 +67,16 @@ class RedditAIAgent:
             'novelty': float(os.getenv('WEIGHT_NOVELTY', '0.2'))
         }
     
+    def close(self):
+        """Commit pending database writes and close the database."""
+        self.db.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
     def calculate_utility(self, metrics: UtilityMetrics) -> float:
         """
         Calculate utility score based on multiple metrics.
@@ -69,8 +89,18 @@ class RedditAIAgent:
             self.utility_weights['novelty'] * metrics.novelty_score
         )
     
+    def calculate_utility_batch(self, metrics: UtilityMetricsBatch) -> np.ndarray:
+        """Calculate utility scores for many submissions at once, one per batch row."""
+        weights = np.array([
+            self.utility_weights[key]
+            for key in ('engagement', 'sentiment', 'relevance', 'novelty')
+        ])
+        return metrics.utility(weights)
+    
     def process_subreddit(self, subreddit_name: str, limit: int = 10) -> List[Dict]:
         """Process submissions from a subreddit and learn from them."""
+        pending_submissions = []
+        pending_patterns = []
         try:
             # Validate subreddit exists and is accessible
             subreddit = self.reddit.subreddit(subreddit_name)
@@ -81,48 +111,71 @@ class RedditAIAgent:
                 return []
             
             processed_submissions = []
+            processed_ids = self.db.get_processed_ids(str(subreddit))
+            now = time.time()
             
+            # Analyze new submissions and collect their utility metrics
+            candidates = []
+            metrics_batch = UtilityMetricsBatch()
             for submission in subreddit.new(limit=limit):
                 try:
-                    if not self.db.is_submission_processed(submission.id):
+                    if submission.id not in processed_ids:
                         # Analyze submission
                         analysis = self.analyzer.analyze_submission(submission)
                         
                         # Calculate utility metrics
                         metrics = UtilityMetrics(
-                            engagement_rate=self.analyzer.calculate_engagement_rate(submission),
+                            engagement_rate=self.analyzer.calculate_engagement_rate(submission, now),
                             sentiment_score=analysis['sentiment'],
                             relevance_score=self.analyzer.calculate_relevance(submission, analysis),
                             novelty_score=self.analyzer.calculate_novelty(submission, analysis)
                         )
-                        
-                        # Calculate overall utility
-                        utility_score = self.calculate_utility(metrics)
-                        
-                        # Store submission with utility score
-                        self.db.store_submission(submission, analysis, utility_score)
-                        
-                        # Update internal model
-                        self.update_model(subreddit_name, {
-                            'avg_engagement': metrics.engagement_rate,
-                            'avg_sentiment': metrics.sentiment_score,
-                            'avg_relevance': metrics.relevance_score,
-                            'avg_novelty': metrics.novelty_score
-                        })
-                        
-                        # Learn from high-utility submissions
-                        if utility_score > 0.7:  # Only learn from high-quality submissions
-                            self._learn_from_submission(submission, analysis, utility_score)
-                        
-                        processed_submissions.append({
-                            'id': submission.id,
-                            'title': submission.title,
-                            'utility_score': utility_score,
-                            'metrics': metrics.__dict__
-                        })
+                        metrics_batch.append(metrics)
+                        candidates.append((submission, analysis, metrics))
+                        processed_ids.add(submission.id)  # Skip repeats later in the listing
+                except Exception as e:
+                    logger.error(f"Error processing submission {submission.id}: {str(e)}")
+                    continue
+            
+            if not candidates:
+                return processed_submissions
+            
+            # Calculate overall utility for all submissions at once
+            utility_scores = self.calculate_utility_batch(metrics_batch)
+            
+            for (submission, analysis, metrics), utility_score in zip(candidates, utility_scores.tolist()):
+                try:
+                    # Queue submission with utility score for a bulk insert
+                    pending_submissions.append(
+                        self.db.submission_row(submission, analysis, utility_score, now)
+                    )
+                    
+                    # Update internal model
+                    self.update_model(subreddit_name, {
+                        'avg_engagement': metrics.engagement_rate,
+                        'avg_sentiment': metrics.sentiment_score,
+                        'avg_relevance': metrics.relevance_score,
+                        'avg_novelty': metrics.novelty_score
+                    })
+                    
+                    # Learn from high-utility submissions
+                    if utility_score > 0.7:  # Only learn from high-quality submissions
+                        pending_patterns.append(
+                            self._learn_from_submission(submission, analysis, utility_score, now)
+                        )
+                    
+                    processed_submissions.append({
+                        'id': submission.id,
+                        'title': submission.title,
+                        'utility_score': utility_score,
+                        'metrics': metrics.__dict__
+                    })
                 except Exception as e:
                     logger.error(f"Error processing submission {submission.id}: {str(e)}")
                     continue
+                
+                if len(pending_submissions) >= self.store_batch_size:
+                    self._store_pending(pending_submissions, pending_patterns)
             
             return processed_submissions
             
@@ -135,29 +188,70 @@ class RedditAIAgent:
         except Exception as e:
             logger.error(f"Error processing subreddit {subreddit_name}: {str(e)}")
             return []
+        finally:
+            # Store whatever is still queued and commit the current write batch
+            self._store_pending(pending_submissions, pending_patterns)
+            self.db.flush()
+    
+    @property
+    def subreddit_models(self) -> Dict[str, Dict]:
+        """Internal models as a dict of per-subreddit dicts."""
+        return {subreddit: self.get_model(subreddit) for subreddit in self._sub_idx}
+    
+    def get_model(self, subreddit: str) -> Dict:
+        """Return the internal model for a subreddit, or an empty dict if it has none."""
+        if subreddit not in self._sub_idx:
+            return {}
+        row = self._metrics[self._sub_idx[subreddit]]
+        model = {key: float(value) for key, value in zip(MODEL_METRICS, row)}
+        model.update(self._model_extras.get(subreddit, {}))
+        return model
+    
+    def top_subreddits(self, metric: str, k: int = 5) -> List[str]:
+        """Return up to k modeled subreddits with the highest value of a model metric."""
+        names = list(self._sub_idx)
+        column = self._metrics[:len(names), MODEL_METRICS.index(metric)]
+        return [names[i] for i in np.argsort(column)[::-1][:k]]
     
     def update_model(self, subreddit: str, new_data: Dict):
         """Update internal model for a subreddit based on new observations."""
-        if subreddit not in self.subreddit_models:
-            self.subreddit_models[subreddit] = new_data
+        is_new = subreddit not in self._sub_idx
+        i = self._sub_idx.setdefault(subreddit, len(self._sub_idx))
+        if i >= len(self._metrics):
+            self._metrics = np.concatenate([self._metrics, np.zeros_like(self._metrics)])
+        
+        # Metrics missing from new_data keep their old value through the blend
+        new_values = self._metrics[i].copy()
+        for key, value in new_data.items():
+            if key in MODEL_METRICS:
+                try:
+                    new_values[MODEL_METRICS.index(key)] = float(value)
+                    continue
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"Could not update model for key {key}: {str(e)}")
+            self._model_extras[subreddit][key] = value
+        
+        if is_new:
+            self._metrics[i] = new_values
         else:
-            for key, value in new_data.items():
-                if key == 'topics':  # Handle topics list separately
-                    self.subreddit_models[subreddit][key] = value
-                else:
-                    try:
-                        old_value = float(self.subreddit_models[subreddit].get(key, 0))
-                        new_value = float(value)
-                        self.subreddit_models[subreddit][key] = (
-                            (1 - self.learning_rate) * old_value +
-                            self.learning_rate * new_value
-                        )
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"Could not update model for key {key}: {str(e)}")
-                        self.subreddit_models[subreddit][key] = value
+            self._metrics[i] = _ema_update(self._metrics[i], new_values, np.float32(self.learning_rate))
     
-    def _learn_from_submission(self, submission, analysis: Dict, utility_score: float):
-        """Learn patterns from high-utility submissions."""
+    def _store_pending(self, pending_submissions: List[tuple], pending_patterns: List[tuple]):
+        """Flush queued submission and pattern rows to the database and clear the queues."""
+        try:
+            self.db.store_submissions_bulk(pending_submissions)
+        except sqlite3.Error as e:
+            logger.error(f"Error storing {len(pending_submissions)} submissions: {str(e)}")
+        try:
+            self.db.store_patterns_bulk(pending_patterns)
+        except sqlite3.Error as e:
+            logger.error(f"Error storing {len(pending_patterns)} patterns: {str(e)}")
+        pending_submissions.clear()
+        pending_patterns.clear()
+    
+    def _learn_from_submission(self, submission, analysis: Dict, utility_score: float,
+                               now: Optional[float] = None) -> tuple:
+        """Learn patterns from high-utility submissions, returning the pattern row to store."""
         pattern_data = {
             'title_length': len(submission.title),
             'content_length': len(submission.selftext),
@@ -165,27 +259,23 @@ class RedditAIAgent:
             'topics': analysis['topics']
         }
         
-        self.db.store_pattern(
+        return self.db.pattern_row(
             subreddit=str(submission.subreddit),
             pattern_type="successful_post",
             pattern_data=pattern_data,
-            confidence=utility_score
+            confidence=utility_score,
+            now=now
         )
     
     def get_recommendations(self, subreddit: str) -> List[Dict]:
         """Generate recommendations based on learned patterns."""
-        patterns = self.db.get_patterns(subreddit)
-        model_data = self.subreddit_models.get(subreddit, {})
+        # Patterns come back ordered by confidence, so these are the five best
+        best_patterns = self.db.get_patterns(subreddit, top_k=5)
+        model_data = self.get_model(subreddit)
         
         recommendations = []
-        if patterns and model_data:
+        if best_patterns and model_data:
             # Analyze patterns to generate recommendations
-            best_patterns = sorted(
-                patterns,
-                key=lambda x: x['confidence'],
-                reverse=True
-            )[:5]
-            
             for pattern in best_patterns:
                 recommendations.append({
                     'type': pattern['pattern_type'],
@@ -1,7 +1,7 @@
 """Content analysis utilities for the Reddit AI Agent."""
 
-from datetime import datetime
-from typing import Dict
+import time
+from typing import Dict, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,26 +21,22 @@ class ContentAnalyzer:
             'topics': ['general']  # Default topic
         }
     
-    def calculate_engagement_rate(self, submission) -> float:
-        """Calculate normalized engagement rate for a submission."""
+    def calculate_engagement_rate(self, submission, now: Optional[float] = None) -> float:
+        """
+        Calculate normalized engagement rate for a submission.
+        `now` is the current Unix time; pass it in when scoring many submissions.
+        """
         try:
-            # Get the number of comments safely
-            comment_count = 0
-            if hasattr(submission, 'comments'):
-                try:
-                    comment_count = len(list(submission.comments))
-                except Exception:
-                    # If we can't get comments, just use 0
-                    pass
+            # Use the comment count from the listing rather than fetching the comments
+            comment_count = getattr(submission, 'num_comments', 0)
             
             # Calculate engagement safely
             score = getattr(submission, 'score', 0)
             total_engagement = float(score + comment_count)
             
             # Calculate time factor
-            current_time = datetime.utcnow().timestamp()
-            submission_time = getattr(submission, 'created_utc', current_time)
-            time_factor = max(1.0, (current_time - submission_time) / 3600.0)
+            current_time = time.time() if now is None else now
+            time_factor = max(1.0, (current_time - submission.created_utc) / 3600.0)
             
             return min(1.0, total_engagement / (100.0 * time_factor))
         except Exception as e:
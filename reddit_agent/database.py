@@ -1,22 +1,115 @@
 """Database operations for the Reddit AI Agent."""
 
 import sqlite3
-from datetime import datetime
-import json
-from typing import Dict, List, Optional
+import threading
+import time
+import weakref
+import orjson
+from typing import Dict, Iterator, List, Optional
+
+from .models import MarketInsight, SubredditInfo
+
+INSERT_SUBMISSION_SQL = """
+    INSERT OR IGNORE INTO submissions (
+        submission_id, title, content, author, subreddit,
+        created_utc, processed_at, sentiment, topics,
+        engagement_score, utility_score
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_PATTERN_SQL = """
+    INSERT INTO learned_patterns (
+        subreddit, pattern_type, pattern_data, confidence, 
+        utility_score, last_updated
+    ) VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+def _commit_pending(conn: sqlite3.Connection, lock: threading.Lock):
+    """Commit the connection's open batch transaction, if it is still open."""
+    with lock:
+        try:
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+        except sqlite3.ProgrammingError:  # The connection was already closed
+            pass
 
 class Database:
     """Handles all database operations for the Reddit AI Agent."""
     
-    def __init__(self, db_path: str):
-        """Initialize database connection and create tables."""
+    def __init__(self, db_path: str, commit_every: int = 50):
+        """
+        Initialize database connection and create tables.
+        Writes are grouped into transactions of up to commit_every statements;
+        call flush() to commit any pending writes. Writes still pending when the
+        database is garbage collected or the interpreter exits are committed then.
+        """
         self.db_path = db_path
+        self.commit_every = commit_every
+        self._pending_writes = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA cache_size=-65536")
         self.setup_database()
+        self._finalizer = weakref.finalize(self, _commit_pending, self.conn, self._lock)
+    
+    def _write(self, sql: str, params: tuple):
+        """Execute a write inside the current batch transaction."""
+        with self._lock:
+            if not self.conn.in_transaction:
+                self.conn.execute("BEGIN")
+            self.conn.execute(sql, params)
+            self._pending_writes += 1
+            if self._pending_writes >= self.commit_every:
+                self.conn.execute("COMMIT")
+                self._pending_writes = 0
+    
+    def _write_many(self, sql: str, rows: List[tuple]):
+        """
+        Execute a write for every row and commit them, with any pending writes, at once.
+        If the rows fail, only they are rolled back; pending writes are kept.
+        """
+        if not rows:
+            return
+        with self._lock:
+            if not self.conn.in_transaction:
+                self.conn.execute("BEGIN")
+            self.conn.execute("SAVEPOINT write_many")
+            try:
+                self.conn.executemany(sql, rows)
+            except sqlite3.Error:
+                self.conn.execute("ROLLBACK TO write_many")
+                self.conn.execute("RELEASE write_many")
+                raise
+            self.conn.execute("RELEASE write_many")
+            self.conn.execute("COMMIT")
+            self._pending_writes = 0
+    
+    def flush(self):
+        """Commit any pending writes."""
+        with self._lock:
+            if self.conn.in_transaction:
+                self.conn.execute("COMMIT")
+            self._pending_writes = 0
+    
+    def close(self):
+        """Commit pending writes and close the connection."""
+        self.flush()
+        self.conn.close()
+        self._finalizer.detach()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
     
     def setup_database(self):
         """Create necessary database tables if they don't exist."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._lock:
+            cursor = self.conn.cursor()
             
             # Table for storing processed submissions
             cursor.execute("""
@@ -59,84 +152,181 @@ class Database:
                 )
             """)
             
-            conn.commit()
+            # Table for storing subreddit information
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS subreddits (
+                    name TEXT PRIMARY KEY,
+                    title TEXT,
+                    description TEXT,
+                    subscribers INTEGER,
+                    last_updated TIMESTAMP
+                )
+            """)
+            
+            # Table for storing market research insights
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS market_insights (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    subreddit_name TEXT,
+                    target_market TEXT,
+                    created_at TIMESTAMP,
+                    needs_found TEXT
+                )
+            """)
+            
+            # Indexes for per-subreddit lookups; the composite pattern index
+            # also returns rows already ordered by confidence
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_patterns_subreddit
+                ON learned_patterns(subreddit, confidence DESC)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_submissions_subreddit
+                ON submissions(subreddit COLLATE NOCASE)
+            """)
     
     def is_submission_processed(self, submission_id: str) -> bool:
         """Check if a submission has already been processed."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._lock:
+            cursor = self.conn.cursor()
             cursor.execute(
                 "SELECT 1 FROM submissions WHERE submission_id = ?",
                 (submission_id,)
             )
             return cursor.fetchone() is not None
     
-    def store_submission(self, submission, analysis: Dict, utility_score: float):
+    def get_processed_ids(self, subreddit: str) -> set:
+        """Return the IDs of all submissions already processed for a subreddit."""
+        with self._lock:
+            cursor = self.conn.execute(
+                "SELECT submission_id FROM submissions WHERE subreddit = ? COLLATE NOCASE",
+                (subreddit,)
+            )
+            return {row[0] for row in cursor}
+    
+    @staticmethod
+    def submission_row(submission, analysis: Dict, utility_score: float,
+                       now: Optional[float] = None) -> tuple:
+        """
+        Build the submissions table row for a submission and its analysis.
+        `now` is the processing time; pass it in when building many rows.
+        """
+        return (
+            submission.id,
+            submission.title,
+            submission.selftext,
+            str(submission.author),
+            str(submission.subreddit),
+            submission.created_utc,
+            time.time() if now is None else now,
+            analysis['sentiment'],
+            orjson.dumps(analysis['topics']).decode(),
+            analysis.get('engagement_rate', 0.0),
+            utility_score
+        )
+    
+    @staticmethod
+    def pattern_row(subreddit: str, pattern_type: str,
+                    pattern_data: Dict, confidence: float,
+                    now: Optional[float] = None) -> tuple:
+        """Build the learned_patterns table row for a pattern; see submission_row for `now`."""
+        return (
+            subreddit,
+            pattern_type,
+            orjson.dumps(pattern_data).decode(),
+            confidence,
+            confidence,  # Using confidence as utility score for simplicity
+            time.time() if now is None else now
+        )
+    
+    def store_submission(self, submission, analysis: Dict, utility_score: float,
+                         now: Optional[float] = None):
         """Store submission and its analysis in the database."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO submissions (
-                    submission_id, title, content, author, subreddit,
-                    created_utc, processed_at, sentiment, topics,
-                    engagement_score, utility_score
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                submission.id,
-                submission.title,
-                submission.selftext,
-                str(submission.author),
-                str(submission.subreddit),
-                submission.created_utc,
-                datetime.now().timestamp(),
-                analysis['sentiment'],
-                json.dumps(analysis['topics']),
-                analysis.get('engagement_rate', 0.0),
-                utility_score
-            ))
-            conn.commit()
+        self._write(INSERT_SUBMISSION_SQL, self.submission_row(submission, analysis, utility_score, now))
+    
+    def store_submissions_bulk(self, rows: List[tuple]):
+        """Store many submission rows (see submission_row) in a single transaction."""
+        self._write_many(INSERT_SUBMISSION_SQL, rows)
     
     def store_pattern(self, subreddit: str, pattern_type: str, 
                      pattern_data: Dict, confidence: float):
         """Store a learned pattern in the database."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO learned_patterns (
-                    subreddit, pattern_type, pattern_data, confidence, 
-                    utility_score, last_updated
-                ) VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                subreddit,
-                pattern_type,
-                json.dumps(pattern_data),
-                confidence,
-                confidence,  # Using confidence as utility score for simplicity
-                datetime.now().timestamp()
-            ))
-            conn.commit()
-    
-    def get_patterns(self, subreddit: str) -> List[Dict]:
-        """Retrieve learned patterns from the database for a specific subreddit."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT pattern_id, pattern_type, pattern_data, confidence, 
-                       utility_score, last_updated
-                FROM learned_patterns
-                WHERE subreddit = ?
-                ORDER BY confidence DESC
-            """, (subreddit,))
+        self._write(INSERT_PATTERN_SQL, self.pattern_row(subreddit, pattern_type, pattern_data, confidence))
+    
+    def store_patterns_bulk(self, rows: List[tuple]):
+        """Store many pattern rows (see pattern_row) in a single transaction."""
+        self._write_many(INSERT_PATTERN_SQL, rows)
+    
+    def get_patterns(self, subreddit: str, top_k: Optional[int] = None) -> List[Dict]:
+        """
+        Retrieve learned patterns from the database for a specific subreddit,
+        highest confidence first. If top_k is given, only that many are returned.
+        """
+        sql = """
+            SELECT pattern_id, pattern_type, pattern_data, confidence, 
+                   utility_score, last_updated
+            FROM learned_patterns
+            WHERE subreddit = ?
+            ORDER BY confidence DESC
+        """
+        params = (subreddit,)
+        if top_k is not None:
+            sql += " LIMIT ?"
+            params += (top_k,)
+        
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(sql, params)
             
             patterns = []
             for row in cursor.fetchall():
                 patterns.append({
                     'pattern_id': row[0],
                     'pattern_type': row[1],
-                    'pattern_data': json.loads(row[2]),
+                    'pattern_data': orjson.loads(row[2]),
                     'confidence': row[3],
                     'utility_score': row[4],
                     'last_updated': row[5]
                 })
             
             return patterns
+    
+    def _iter_rows(self, sql: str, params: tuple = (), chunk_size: int = 256) -> Iterator[tuple]:
+        """Yield query rows one at a time, fetching them from SQLite in chunks."""
+        with self._lock:
+            cursor = self.conn.execute(sql, params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield from rows
+    
+    def _count(self, table: str) -> int:
+        with self._lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    
+    def count_subreddits(self) -> int:
+        """Return the number of stored subreddits."""
+        return self._count("subreddits")
+    
+    def iter_subreddits(self) -> Iterator[SubredditInfo]:
+        """Stream all stored subreddits."""
+        for row in self._iter_rows("""
+            SELECT name, title, description, subscribers, last_updated
+            FROM subreddits
+        """):
+            yield SubredditInfo(*row)
+    
+    def count_market_insights(self) -> int:
+        """Return the number of stored market insights."""
+        return self._count("market_insights")
+    
+    def iter_market_insights(self) -> Iterator[MarketInsight]:
+        """Stream all stored market insights."""
+        for row in self._iter_rows("""
+            SELECT id, subreddit_name, target_market, created_at,
+                   CASE WHEN json_valid(needs_found) THEN json_array_length(needs_found) ELSE 0 END AS n_needs
+            FROM market_insights
+        """):
+            yield MarketInsight(*row)
@@ -1,166 +1,759 @@
 """LLM integration for enhanced content analysis."""
 
 import os
-from typing import Dict, List, Tuple
+import re
+import asyncio
+from typing import Callable, Dict, List, Optional, Tuple
 import logging
-import json
-from groq import Groq
+import orjson
+import hashlib
+import functools
+from collections import OrderedDict
+from dataclasses import dataclass
+import numpy as np
+import httpx
+from groq import APIConnectionError, AsyncGroq, Groq, RateLimitError
+from tenacity import (before_sleep_log, retry, retry_if_exception_type, stop_after_attempt,
+                      wait_random_exponential)
+
+from .llm_cache import SemanticCache, embed
+from . import prompts
+
+try:
+    import h2
+except ImportError:  # httpx only speaks HTTP/2 with the h2 package installed
+    h2 = None
 
 logger = logging.getLogger(__name__)
 
+# Connection pool shared by all requests of one client, so calls reuse warm TLS sockets
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=30)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
 def safe_parse_json(json_str: str) -> Dict:
-    """Safely parse JSON string, handling common LLM response issues."""
+    """
+    Safely parse JSON string, handling common LLM response issues.
+    Locating the JSON within a reply is memoized per string, but every call parses
+    it into fresh objects, so callers may mutate the result.
+    """
+    json_text = _json_text_cached(json_str)
+    return orjson.loads(json_text) if json_text is not None else {}
+
+@functools.lru_cache(maxsize=2048)
+def _json_text_cached(json_str: str) -> Optional[str]:
+    """Return the part of json_str that parses as JSON, or None if there is none."""
     try:
         # Try to parse as-is first
-        return json.loads(json_str)
-    except json.JSONDecodeError:
+        orjson.loads(json_str)
+        return json_str
+    except orjson.JSONDecodeError:
+        # Try the first balanced JSON object within the text
+        json_obj = _find_json_object(json_str)
+        if json_obj is not None:
+            return json_obj
+    
+    logger.error("Failed to parse LLM response: %s", json_str)
+    return None
+
+def _find_json_object(text: str) -> Optional[str]:
+    """
+    Return the first balanced {...} span in text that parses as JSON, or None.
+    Braces inside JSON strings (including escaped quotes) are ignored, so markdown
+    fences, preambles, and trailing commentary around the object don't matter; a
+    span that turns out not to be JSON (such as "{here}" in a preamble) is skipped.
+    """
+    start = text.find('{')
+    while start != -1:
+        end = _balanced_end(text, start)
+        if end is None:
+            # Everything after an unclosed brace is nested in it (e.g. still streaming)
+            return None
         try:
-            # Try to find JSON object within the text
-            start_idx = json_str.find('{')
-            end_idx = json_str.rfind('}') + 1
-            if start_idx != -1 and end_idx != 0:
-                json_obj = json_str[start_idx:end_idx]
-                return json.loads(json_obj)
-        except (json.JSONDecodeError, ValueError):
+            orjson.loads(text[start:end])
+            return text[start:end]
+        except orjson.JSONDecodeError:
             pass
+        # Resume after a rejected span rather than inside it, so a nested object of
+        # a malformed reply isn't mistaken for the reply
+        start = text.find('{', end)
+    return None
+
+def _balanced_end(text: str, start: int) -> Optional[int]:
+    """Return the index just past the brace closing the one at start, or None if it isn't closed."""
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+def _batch_results(response: str, expected: int, number_key: str) -> Optional[List[Dict]]:
+    """
+    Extract the per-item entries from a batched {"results": [...]} response, in item order.
+    Each entry is placed by the 1-based item number in its number_key field, which is
+    removed. Returns None unless the entries are numbered exactly 1 to expected.
+    """
+    parsed = safe_parse_json(response)
+    entries = parsed.get('results') if isinstance(parsed, dict) else None
+    if not isinstance(entries, list) or len(entries) != expected:
+        return None
+    ordered = [None] * expected
+    for entry in entries:
+        number = entry.pop(number_key, None) if isinstance(entry, dict) else None
+        if isinstance(number, str) and number.strip().isdigit():
+            number = int(number)
+        if isinstance(number, bool) or not isinstance(number, int) or not 1 <= number <= expected:
+            return None
+        if ordered[number - 1] is not None:  # Duplicate number
+            return None
+        ordered[number - 1] = entry
+    return ordered
+
+# (template_id, text, context) identifying a cacheable completion; see SemanticCache
+CacheKey = Tuple[str, str, str]
+
+# In-process memo of exact prompts; longer prompts (large batches) are not memoized
+MEMO_SIZE = 4096
+MEMO_MAX_PROMPT_CHARS = 32768
+
+SYSTEM_PROMPT = """You are a helpful AI that provides analysis in JSON format. Always ensure your responses are valid JSON objects.
+                When asked for several scores or fields, return all of them together in a single JSON object using exactly the requested keys.
+                When analyzing relevance, be inclusive rather than exclusive - if there's any possibility the content could be relevant, mark it as relevant."""
+
+# Numeric scores returned together (with topics) by LLMAnalyzer.score_all
+SCORE_NAMES = ('sentiment', 'relevance', 'novelty')
+
+# Matches a row separator or one "score": number pair in joined score replies
+SCORE_PAIR_RE = re.compile(
+    r'(\x00)|"(' + '|'.join(SCORE_NAMES) + r')"\s*:\s*"?(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)'
+)
+
+def parse_score_matrix(responses: List[str]) -> np.ndarray:
+    """
+    Parse score_all-style replies into a float32 array of shape (len(responses), 3).
+    Columns follow SCORE_NAMES; missing scores default to 0.5 and all scores are
+    clipped to [0, 1]. All replies are scanned in a single regex pass.
+    """
+    rows, cols, values = [], [], []
+    row = 0
+    for match in SCORE_PAIR_RE.finditer('\x00'.join(responses)):
+        if match.group(1):
+            row += 1
+            continue
+        rows.append(row)
+        cols.append(SCORE_NAMES.index(match.group(2)))
+        values.append(match.group(3))
     
-    logger.error(f"Failed to parse LLM response: {json_str}")
-    return {}
+    scores = np.full((len(responses), len(SCORE_NAMES)), 0.5, dtype=np.float32)
+    if values:
+        scores[rows, cols] = np.array(values).astype(np.float32)
+    return np.clip(scores, 0.0, 1.0, out=scores)
+
+# max_tokens per task, per item for batched prompts; sized to the expected reply
+TASK_LIMITS = {
+    "score": 128,
+    "relevance": 128,
+    "market_need": 256,
+    "suggestion": 256,
+    "insights": 512,
+}
+
+# Tasks whose replies are plain text rather than a JSON object
+TEXT_TASKS = frozenset({"suggestion"})
+
+# Errors retried by retry_transient
+TRANSIENT_ERRORS = (RateLimitError, APIConnectionError)
+
+# Retry rate limits and connection failures with jittered exponential backoff;
+# other errors, and the last failure once attempts run out, are raised to the caller
+retry_transient = retry(
+    retry=retry_if_exception_type(TRANSIENT_ERRORS),
+    wait=wait_random_exponential(multiplier=0.5, max=20),
+    stop=stop_after_attempt(5),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True,
+)
+
+@dataclass(frozen=True)
+class BatchTask:
+    """
+    A per-text JSON analysis that can also be packed into batched prompts.
+    context is what the prompt is conditioned on besides the text, such as the target market.
+    """
+    task: str  # TASK_LIMITS key, also the cache template id
+    name: str  # What is analyzed, for log messages
+    items: str  # Plural noun for the batched texts, for log messages
+    number_key: str  # Field holding each batched entry's 1-based item number
+    prompt: Callable[[str, str], str]  # (text, context) -> single-text prompt
+    batch_prompt: Callable[[List[str], str], str]  # (texts, context) -> batched prompt
+    parse: Callable[[Dict], Tuple]  # Parsed reply object -> result tuple
+    error: Callable[[Exception], Tuple]  # Result when the request fails
+    log_level: int = logging.DEBUG  # Level for logging each parsed single-text reply
+
+def _parse_relevance(analysis: Dict) -> Tuple[bool, float, str]:
+    return (
+        analysis.get('is_relevant', False),
+        analysis.get('confidence', 0.0),
+        analysis.get('reason', 'No reason provided')
+    )
+
+def _parse_market_need(analysis: Dict) -> Tuple[bool, float, Dict]:
+    return (
+        analysis.get('is_need', False),
+        analysis.get('confidence', 0.0),
+        analysis
+    )
+
+RELEVANCE_TASK = BatchTask(
+    task="relevance",
+    name="subreddit relevance",
+    items="subreddits",
+    number_key="subreddit",
+    prompt=lambda description, target_market: prompts.build_relevance_prompt(
+        target_market=target_market, description=description
+    ),
+    batch_prompt=lambda descriptions, target_market: prompts.build_relevance_batch_prompt(
+        count=str(len(descriptions)), target_market=target_market,
+        descriptions=prompts.numbered("Subreddit", descriptions)
+    ),
+    parse=_parse_relevance,
+    error=lambda e: (False, 0.0, str(e)),
+    log_level=logging.INFO,
+)
+
+MARKET_NEED_TASK = BatchTask(
+    task="market_need",
+    name="market need",
+    items="posts",
+    number_key="post",
+    prompt=lambda text, _: prompts.build_market_need_prompt(text=text),
+    batch_prompt=lambda texts, _: prompts.build_market_need_batch_prompt(
+        count=str(len(texts)), posts=prompts.numbered("Post", texts)
+    ),
+    parse=_parse_market_need,
+    error=lambda e: (False, 0.0, {}),
+)
 
 class LLMAnalyzer:
     """Handles LLM-based content analysis using Groq."""
     
-    def __init__(self):
-        """Initialize the LLM analyzer."""
-        self.client = Groq()
+    def __init__(self, cache: Optional[SemanticCache] = None, max_concurrency: Optional[int] = None):
+        """
+        Initialize the LLM analyzer.
+        max_concurrency bounds the number of in-flight async completions
+        (default: GROQ_CONCURRENCY, or 8).
+        """
+        self._http = httpx.Client(http2=h2 is not None, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        # Retries are handled by retry_transient rather than the SDK's own retry loop
+        self.client = Groq(http_client=self._http, max_retries=0)
+        self._make_async_client()
         self.model = os.getenv('GROQ_MODEL', 'llama3-8b-8192')
+        self.max_concurrency = max_concurrency or int(os.getenv('GROQ_CONCURRENCY', '8'))
+        self._loop = None  # Event loop the async client and semaphore are bound to
+        self._semaphore = None  # Created on first async call, inside the running event loop
+        self._last_scores = None  # ((text, subreddit), scores) of the last score_all call
+        self._memo = OrderedDict()  # (prompt digest, temperature) -> completion, in LRU order
+        if cache is None and os.getenv('LLM_CACHE', '1') != '0':
+            cache = SemanticCache(os.getenv('LLM_CACHE_PATH', 'llm_cache.db'))
+        self.cache = cache
     
-    def _get_completion(self, prompt: str, temperature: float = 0.7) -> str:
-        """Get completion from Groq API."""
-        try:
-            messages = [
-                {"role": "system", "content": """You are a helpful AI that provides analysis in JSON format. Always ensure your responses are valid JSON objects.
-                When analyzing relevance, be inclusive rather than exclusive - if there's any possibility the content could be relevant, mark it as relevant."""},
+    def _make_async_client(self):
+        """Create the async client and its connection pool."""
+        self._async_http = httpx.AsyncClient(http2=h2 is not None, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        self.async_client = AsyncGroq(http_client=self._async_http, max_retries=0)
+    
+    def _loop_semaphore(self) -> asyncio.Semaphore:
+        """
+        Return the concurrency semaphore for the running event loop.
+        Neither the semaphore nor the async client's pooled connections can be used
+        from another loop, so when the analyzer is used from a new loop (such as a
+        second asyncio.run) both are recreated; the old pool died with its loop.
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            if self._loop is not None:
+                self._make_async_client()
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+    
+    def close(self):
+        """Close the sync client's pooled connections."""
+        self._http.close()
+    
+    async def aclose(self):
+        """Close the pooled connections of both clients."""
+        self.close()
+        await self._async_http.aclose()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+    
+    def _completion_kwargs(self, prompt: str, temperature: float, max_tokens: int) -> Dict:
+        """Build the chat completion request shared by the sync and async clients."""
+        return dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
-            ]
-            
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=1024,
-                top_p=1,
-                stream=False,
-                stop=None,
-            )
-            response = completion.choices[0].message.content
-            logger.debug(f"LLM Response: {response}")
-            return response
-        except Exception as e:
-            logger.error(f"Error getting LLM completion: {str(e)}")
-            return "{}"
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=1,
+            stream=True,
+            stop=None,
+        )
     
-    def analyze_sentiment(self, text: str) -> float:
-        """Analyze sentiment of text using LLM."""
-        prompt = f"""Analyze the sentiment of the following text and return a score between 0 and 1,
-        where 0 is extremely negative and 1 is extremely positive. Return only the numeric score.
-        
-        Text: {text}"""
-        
+    @staticmethod
+    def _append_delta(parts: List[str], chunk, json_reply: bool) -> bool:
+        """
+        Add a streamed chunk's text to parts.
+        Returns True once a JSON reply holds a complete object that parses, so the
+        rest of the generation (trailing commentary) need not be awaited.
+        """
+        if not chunk.choices:
+            return False
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            return False
+        parts.append(delta)
+        return json_reply and '}' in delta and _find_json_object(''.join(parts)) is not None
+    
+    @staticmethod
+    def _memo_key(prompt: str, temperature: float) -> Optional[Tuple[str, float]]:
+        if len(prompt) > MEMO_MAX_PROMPT_CHARS:
+            return None
+        return hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).hexdigest(), temperature
+    
+    def _memo_get(self, memo_key: Optional[Tuple[str, float]]) -> Optional[str]:
+        if memo_key is None or memo_key not in self._memo:
+            return None
+        self._memo.move_to_end(memo_key)
+        return self._memo[memo_key]
+    
+    def _memo_put(self, memo_key: Optional[Tuple[str, float]], response: str):
+        if memo_key is None:
+            return
+        self._memo[memo_key] = response
+        self._memo.move_to_end(memo_key)
+        if len(self._memo) > MEMO_SIZE:
+            self._memo.popitem(last=False)
+    
+    def _remember(self, memo_key: Optional[Tuple[str, float]], response: str):
+        """Log a fresh completion and add it to the memo."""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("LLM Response: %s", response)
+        self._memo_put(memo_key, response)
+    
+    def _cache_get(self, cache_key: Optional[CacheKey]) -> Optional[str]:
+        if self.cache is None or cache_key is None:
+            return None
+        template_id, text, context = cache_key
+        return self.cache.get(text, template_id, context)
+    
+    def _cache_put(self, cache_key: Optional[CacheKey], response: str):
+        """Cache a completion unless it is an error fallback or unparseable."""
+        if self.cache is None or cache_key is None:
+            return
+        parsed = safe_parse_json(response)
+        if not parsed or not isinstance(parsed, dict):
+            return
+        template_id, text, context = cache_key
+        self.cache.put(text, response, template_id, context)
+    
+    @retry_transient
+    def _request(self, prompt: str, task: str, temperature: float, items: int) -> str:
+        """Stream one completion from the sync client."""
+        stream = self.client.chat.completions.create(
+            **self._completion_kwargs(prompt, temperature, TASK_LIMITS[task] * items)
+        )
+        parts = []
         try:
-            response = self._get_completion(prompt, temperature=0.3)
-            return float(response.strip())
-        except (ValueError, TypeError) as e:
-            logger.error(f"Error parsing sentiment score: {str(e)}")
-            return 0.5
-    
-    def extract_topics(self, text: str) -> List[str]:
-        """Extract main topics from text using LLM."""
-        prompt = f"""Extract the main topics from the following text. Return only a comma-separated list of topics,
-        with no additional text or punctuation.
+            for chunk in stream:
+                if self._append_delta(parts, chunk, task not in TEXT_TASKS):
+                    break
+        finally:
+            stream.close()
+        return ''.join(parts)
+    
+    @retry_transient
+    async def _request_async(self, prompt: str, task: str, temperature: float, items: int) -> str:
+        """Stream one completion from the async client."""
+        stream = await self.async_client.chat.completions.create(
+            **self._completion_kwargs(prompt, temperature, TASK_LIMITS[task] * items)
+        )
+        parts = []
+        try:
+            async for chunk in stream:
+                if self._append_delta(parts, chunk, task not in TEXT_TASKS):
+                    break
+        finally:
+            await stream.close()
+        return ''.join(parts)
+    
+    def _get_completion(self, prompt: str, task: str, temperature: float = 0.7, items: int = 1,
+                        cache_key: Optional[CacheKey] = None) -> str:
+        """
+        Get completion from Groq API for a task in TASK_LIMITS.
+        max_tokens is the task's limit times the number of items batched in the prompt.
+        The reply is streamed; for JSON replies the stream is closed as soon as the
+        top-level object is complete. Rate limits and connection errors are retried
+        with backoff; other API errors, and failures that outlast the retries, are raised.
+        Identical prompts are answered from an in-process LRU memo. With a cache_key,
+        a cached completion for the same or a similar text is returned instead of
+        calling the API, and fresh completions are added to the cache.
+        """
+        memo_key = self._memo_key(prompt, temperature)
+        cached_response = self._memo_get(memo_key)
+        if cached_response is None:
+            cached_response = self._cache_get(cache_key)
+        if cached_response is not None:
+            return cached_response
         
-        Text: {text}"""
+        response = self._request(prompt, task, temperature, items)
+        self._remember(memo_key, response)
+        self._cache_put(cache_key, response)
+        return response
+    
+    async def _get_completion_async(self, prompt: str, task: str, temperature: float = 0.7, items: int = 1,
+                                    cache_key: Optional[CacheKey] = None) -> str:
+        """
+        Get completion from Groq API without blocking the event loop; see _get_completion.
+        A request keeps its concurrency slot while backing off, so retries don't add load.
+        Semantic cache lookups and stores run in a worker thread.
+        """
+        use_cache = self.cache is not None and cache_key is not None
+        memo_key = self._memo_key(prompt, temperature)
+        cached_response = self._memo_get(memo_key)
+        if cached_response is None and use_cache:
+            cached_response = await asyncio.to_thread(self._cache_get, cache_key)
+        if cached_response is not None:
+            return cached_response
         
+        async with self._loop_semaphore():
+            response = await self._request_async(prompt, task, temperature, items)
+        self._remember(memo_key, response)
+        if use_cache:
+            await asyncio.to_thread(self._cache_put, cache_key, response)
+        return response
+    
+    @staticmethod
+    def _score_prompt(text: str, subreddit: str) -> str:
+        community = f"the {subreddit} subreddit" if subreddit else "its subreddit"
+        return prompts.build_score_prompt(community=community, text=text)
+    
+    @staticmethod
+    def _parse_scores(response: str) -> Dict:
+        analysis = safe_parse_json(response)
+        if not isinstance(analysis, dict):  # e.g. a bare number
+            analysis = {}
+        scores = {}
+        for name in SCORE_NAMES:
+            try:
+                # Clipped like parse_score_matrix, so score_all and score_batch agree
+                scores[name] = min(max(float(analysis.get(name, 0.5)), 0.0), 1.0)
+            except (ValueError, TypeError) as e:
+                logger.error("Error parsing %s score: %s", name, e)
+                scores[name] = 0.5
+        topics = analysis.get('topics')
+        if isinstance(topics, str):  # The comma-separated form of the old topics prompt
+            topics = topics.split(',')
+        if isinstance(topics, list):
+            topics = [str(topic).strip() for topic in topics if str(topic).strip()]
+        else:
+            topics = None
+        scores['topics'] = topics or ['general']
+        return scores
+    
+    @staticmethod
+    def _default_scores() -> Dict:
+        scores = {name: 0.5 for name in SCORE_NAMES}
+        scores['topics'] = ['general']
+        return scores
+    
+    @staticmethod
+    def _copy_scores(scores: Dict) -> Dict:
+        return {**scores, 'topics': list(scores['topics'])}
+    
+    def score_all(self, text: str, subreddit: str = "") -> Dict:
+        """
+        Score sentiment, relevance, and novelty of text for a subreddit and extract its
+        topics, in one LLM call.
+        Returns a dict with 'sentiment', 'relevance', and 'novelty' scores between 0 and 1
+        and a 'topics' list; scores the LLM doesn't return, or all of them if the request
+        fails, default to 0.5, and topics to ['general'].
+        """
+        key = (text, subreddit)
+        if self._last_scores is not None and self._last_scores[0] == key:
+            return self._copy_scores(self._last_scores[1])
+        
+        try:
+            response = self._get_completion(
+                self._score_prompt(text, subreddit), "score", temperature=0.3,
+                cache_key=('score_topics', text, subreddit)
+            )
+            scores = self._parse_scores(response)
+        except Exception as e:
+            logger.error("Error scoring text: %s", e)
+            return self._default_scores()
+        self._last_scores = (key, scores)
+        return self._copy_scores(scores)
+    
+    async def _score_response_async(self, text: str, subreddit: str) -> str:
+        return await self._get_completion_async(
+            self._score_prompt(text, subreddit), "score", temperature=0.3,
+            cache_key=('score_topics', text, subreddit)
+        )
+    
+    async def score_all_async(self, text: str, subreddit: str = "") -> Dict:
+        """Async variant of score_all."""
         try:
-            response = self._get_completion(prompt, temperature=0.5)
-            topics = [topic.strip() for topic in response.split(',')]
-            return topics
+            response = await self._score_response_async(text, subreddit)
+            return self._parse_scores(response)
         except Exception as e:
-            logger.error(f"Error extracting topics: {str(e)}")
-            return ['general']
+            logger.error("Error scoring text: %s", e)
+            return self._default_scores()
+    
+    async def score_batch(self, texts: List[str], subreddit: str = "") -> np.ndarray:
+        """
+        Score many texts concurrently; see score_all.
+        Returns a float32 array with one row per text, in input order, and one
+        column per score in SCORE_NAMES order (topics are not included).
+        """
+        responses = await asyncio.gather(
+            *[self._score_response_async(text, subreddit) for text in texts], return_exceptions=True
+        )
+        for i, response in enumerate(responses):
+            if isinstance(response, Exception):
+                logger.error("Error scoring text: %s", response)
+                responses[i] = ""  # Parses to the default scores
+        return parse_score_matrix(responses)
+    
+    def analyze_sentiment(self, text: str, subreddit: str = "") -> float:
+        """
+        Analyze sentiment of text using LLM.
+        Reuses the last score_all result for the same text, so scoring sentiment,
+        relevance, and novelty of one text costs a single call.
+        """
+        if self._last_scores is not None and self._last_scores[0][0] == text:
+            return self._last_scores[1]['sentiment']
+        return self.score_all(text, subreddit)['sentiment']
+    
+    def extract_topics(self, text: str, subreddit: str = "") -> List[str]:
+        """
+        Extract main topics from text using LLM.
+        Topics come with the score_all result, reusing the last one for the same text.
+        """
+        if self._last_scores is not None and self._last_scores[0][0] == text:
+            return list(self._last_scores[1]['topics'])
+        return self.score_all(text, subreddit)['topics']
     
     def calculate_relevance(self, text: str, subreddit: str) -> float:
         """Calculate relevance of text to subreddit using LLM."""
-        prompt = f"""On a scale of 0 to 1, how relevant is this text to the {subreddit} subreddit?
-        Consider the typical content and discussions in this subreddit. Return only the numeric score.
-        
-        Text: {text}"""
-        
-        try:
-            response = self._get_completion(prompt, temperature=0.3)
-            return float(response.strip())
-        except (ValueError, TypeError) as e:
-            logger.error(f"Error parsing relevance score: {str(e)}")
-            return 0.5
+        return self.score_all(text, subreddit)['relevance']
     
     def calculate_novelty(self, text: str, subreddit: str) -> float:
         """Calculate novelty of text for subreddit using LLM."""
-        prompt = f"""On a scale of 0 to 1, how novel or unique is this content for the {subreddit} subreddit?
-        Consider common topics and patterns in this subreddit. Return only the numeric score.
-        
-        Text: {text}"""
-        
-        try:
-            response = self._get_completion(prompt, temperature=0.3)
-            return float(response.strip())
-        except (ValueError, TypeError) as e:
-            logger.error(f"Error parsing novelty score: {str(e)}")
-            return 0.5
+        return self.score_all(text, subreddit)['novelty']
     
     def generate_suggestion(self, pattern: Dict, model_data: Dict, subreddit: str) -> str:
         """Generate actionable suggestion based on pattern and model data."""
-        prompt = f"""Generate a specific, actionable suggestion for posting in the {subreddit} subreddit
-        based on the following pattern and model data. Be concise and specific.
-        
-        Pattern: {pattern}
-        Model Data: {model_data}"""
+        prompt = prompts.build_suggestion_prompt(
+            subreddit=subreddit, pattern=str(pattern), model_data=str(model_data)
+        )
         
         try:
-            return self._get_completion(prompt, temperature=0.7)
+            return self._get_completion(prompt, "suggestion", temperature=0.7)
         except Exception as e:
-            logger.error(f"Error generating suggestion: {str(e)}")
+            logger.error("Error generating suggestion: %s", e)
             return "No specific suggestion available"
     
-    def is_relevant_subreddit(self, description: str, target_market: str) -> Tuple[bool, float, str]:
+    def _lookup_cached(self, texts: List[str], template_id: str, context: str,
+                       parse: Callable[[Dict], Tuple]) -> Tuple[List, List[int]]:
         """
-        Determine if a subreddit is relevant for finding product/market needs.
-        Returns relevance (bool), confidence score (0-1), and reason.
+        Return parsed cached results for texts (None where missing) and the indices still to analyze.
+        All texts are looked up together, so misses are embedded in one batch.
         """
-        prompt = f"""Analyze if this subreddit could potentially contain discussions about product needs, market opportunities, or user feedback related to {target_market}.
-        Even if the connection seems indirect, consider how the community might discuss relevant topics.
-        Return a JSON object with ONLY these fields:
-        {{
-            "is_relevant": boolean,
-            "confidence": float between 0 and 1,
-            "reason": string explaining the decision
-        }}
+        if self.cache is None or not texts:
+            return [None] * len(texts), list(range(len(texts)))
+        results = [None] * len(texts)
+        pending = []
+        for i, hit in enumerate(self.cache.get_many(texts, template_id, context)):
+            if hit is not None:
+                results[i] = parse(safe_parse_json(hit))
+            else:
+                pending.append(i)
+        return results, pending
+    
+    def _cache_entries(self, texts: List[str], entries: List[Dict], template_id: str, context: str):
+        """Cache each entry of a batched response as if it were the single-text completion for its text."""
+        if self.cache is None:
+            return
+        items = [(text, orjson.dumps(entry).decode()) for text, entry in zip(texts, entries) if entry]
+        self.cache.put_many(items, template_id, context)
+    
+    def _analyze_one(self, spec: BatchTask, text: str, context: str) -> Tuple:
+        """Analyze a single text for spec in its own completion."""
+        try:
+            response = self._get_completion(
+                spec.prompt(text, context), spec.task, temperature=0.3,
+                cache_key=(spec.task, text, context)
+            )
+            return self._parse_one(spec, response)
+        except Exception as e:
+            logger.error("Error analyzing %s: %s", spec.name, e)
+            return spec.error(e)
+    
+    async def _analyze_one_async(self, spec: BatchTask, text: str, context: str) -> Tuple:
+        """Async variant of _analyze_one."""
+        try:
+            response = await self._get_completion_async(
+                spec.prompt(text, context), spec.task, temperature=0.3,
+                cache_key=(spec.task, text, context)
+            )
+            return self._parse_one(spec, response)
+        except Exception as e:
+            logger.error("Error analyzing %s: %s", spec.name, e)
+            return spec.error(e)
+    
+    @staticmethod
+    def _parse_one(spec: BatchTask, response: str) -> Tuple:
+        analysis = safe_parse_json(response)
+        logger.log(spec.log_level, "Analysis of %s: %s", spec.name, analysis)
+        return spec.parse(analysis)
+    
+    @staticmethod
+    def _parse_chunk(spec: BatchTask, response: str, count: int) -> Optional[Tuple[List[Dict], List[Tuple]]]:
+        """Return the entries of a batched reply and their results, in text order, or None unless there is one per text."""
+        entries = _batch_results(response, count, spec.number_key)
+        if entries is None:
+            logger.warning("Batched %s analysis returned mismatched results for %s %s, retrying individually",
+                           spec.name, count, spec.items)
+            return None
+        return entries, [spec.parse(entry) for entry in entries]
+    
+    @staticmethod
+    def _chunk_failed(spec: BatchTask, count: int, e: Exception) -> Optional[List[Tuple]]:
+        """
+        Return error results for a failed batched request, or None to retry its texts individually.
+        Transient errors have already exhausted their retries, so they aren't repeated per text.
+        """
+        if isinstance(e, TRANSIENT_ERRORS):
+            logger.error("Error analyzing %s batch: %s", spec.name, e)
+            return [spec.error(e) for _ in range(count)]
+        logger.warning("Error analyzing %s batch, retrying individually: %s", spec.name, e)
+        return None
+    
+    def _analyze_chunk(self, spec: BatchTask, texts: List[str], context: str) -> List[Tuple]:
+        """Analyze one batch of texts in a single completion, falling back to per-text calls."""
+        if len(texts) == 1:
+            return [self._analyze_one(spec, texts[0], context)]
+        
+        try:
+            response = self._get_completion(
+                spec.batch_prompt(texts, context), spec.task, temperature=0.3, items=len(texts)
+            )
+            parsed = self._parse_chunk(spec, response, len(texts))
+            if parsed is not None:
+                self._cache_entries(texts, parsed[0], spec.task, context)
+                return parsed[1]
+        except Exception as e:
+            failed = self._chunk_failed(spec, len(texts), e)
+            if failed is not None:
+                return failed
         
-        Target Market: {target_market}
-        Subreddit description: {description}"""
+        return [self._analyze_one(spec, text, context) for text in texts]
+    
+    async def _analyze_chunk_async(self, spec: BatchTask, texts: List[str], context: str) -> List[Tuple]:
+        """Async variant of _analyze_chunk."""
+        if len(texts) == 1:
+            return [await self._analyze_one_async(spec, texts[0], context)]
         
         try:
-            response = self._get_completion(prompt, temperature=0.3)
-            analysis = safe_parse_json(response)
-            logger.info(f"Relevance analysis: {analysis}")
-            
-            is_relevant = analysis.get('is_relevant', False)
-            confidence = analysis.get('confidence', 0.0)
-            reason = analysis.get('reason', 'No reason provided')
-            
-            return is_relevant, confidence, reason
+            response = await self._get_completion_async(
+                spec.batch_prompt(texts, context), spec.task, temperature=0.3, items=len(texts)
+            )
+            parsed = self._parse_chunk(spec, response, len(texts))
+            if parsed is not None:
+                await asyncio.to_thread(self._cache_entries, texts, parsed[0], spec.task, context)
+                return parsed[1]
         except Exception as e:
-            logger.error(f"Error analyzing subreddit relevance: {str(e)}")
-            return False, 0.0, str(e)
+            failed = self._chunk_failed(spec, len(texts), e)
+            if failed is not None:
+                return failed
+        
+        return list(await asyncio.gather(*[self._analyze_one_async(spec, text, context) for text in texts]))
+    
+    def _analyze_batch(self, spec: BatchTask, texts: List[str], context: str, batch_size: int) -> List[Tuple]:
+        """Analyze texts for spec, packing up to batch_size uncached texts into each request."""
+        results, pending = self._lookup_cached(texts, spec.task, context, spec.parse)
+        for start in range(0, len(pending), batch_size):
+            indices = pending[start:start + batch_size]
+            chunk_results = self._analyze_chunk(spec, [texts[i] for i in indices], context)
+            for i, result in zip(indices, chunk_results):
+                results[i] = result
+        return results
+    
+    async def _analyze_batch_async(self, spec: BatchTask, texts: List[str], context: str,
+                                   batch_size: int) -> List[Tuple]:
+        """Async variant of _analyze_batch; batches are sent concurrently."""
+        results, pending = await asyncio.to_thread(self._lookup_cached, texts, spec.task, context, spec.parse)
+        chunks = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+        chunk_results = await asyncio.gather(*[
+            self._analyze_chunk_async(spec, [texts[i] for i in indices], context) for indices in chunks
+        ])
+        for indices, batch in zip(chunks, chunk_results):
+            for i, result in zip(indices, batch):
+                results[i] = result
+        return results
+    
+    def is_relevant_subreddit(self, description: str, target_market: str) -> Tuple[bool, float, str]:
+        """
+        Determine if a subreddit is relevant for finding product/market needs.
+        Returns relevance (bool), confidence score (0-1), and reason.
+        """
+        return self._analyze_one(RELEVANCE_TASK, description, target_market)
+    
+    async def is_relevant_subreddit_async(self, description: str, target_market: str) -> Tuple[bool, float, str]:
+        """Async variant of is_relevant_subreddit."""
+        return await self._analyze_one_async(RELEVANCE_TASK, description, target_market)
+    
+    def is_relevant_subreddit_batch(self, descriptions: List[str], target_market: str,
+                                    batch_size: int = 10) -> List[Tuple[bool, float, str]]:
+        """
+        Determine relevance for several subreddit descriptions, packing up to batch_size into each request.
+        Returns one (is_relevant, confidence, reason) tuple per description, in input order.
+        """
+        return self._analyze_batch(RELEVANCE_TASK, descriptions, target_market, batch_size)
+    
+    async def is_relevant_subreddit_batch_async(self, descriptions: List[str], target_market: str,
+                                                batch_size: int = 10) -> List[Tuple[bool, float, str]]:
+        """Async variant of is_relevant_subreddit_batch; batches are sent concurrently."""
+        return await self._analyze_batch_async(RELEVANCE_TASK, descriptions, target_market, batch_size)
     
     def analyze_market_need(self, text: str) -> Tuple[bool, float, Dict]:
         """
@@ -170,63 +763,61 @@ class LLMAnalyzer:
         - confidence: Confidence score (0-1)
         - details: Dictionary with extracted details
         """
-        prompt = """Analyze if this text contains any discussion of problems, needs, requests, or opportunities that could be addressed by products or services.
-        Be inclusive - if there's any hint of a need or opportunity, include it.
-        Return a JSON object with ONLY these fields:
-        {
-            "is_need": boolean,
-            "confidence": float between 0 and 1,
-            "need_type": "product" or "feature" or "service" or "improvement" or "other",
-            "target_market": string describing who would use this,
-            "problem": string describing the problem/need,
-            "current_solutions": string describing existing solutions mentioned,
-            "opportunity": string describing the potential opportunity
-        }
-        
-        Text: """ + text
-        
-        try:
-            response = self._get_completion(prompt, temperature=0.3)
-            analysis = safe_parse_json(response)
-            logger.debug(f"Market need analysis: {analysis}")
-            return (
-                analysis.get('is_need', False),
-                analysis.get('confidence', 0.0),
-                analysis
-            )
-        except Exception as e:
-            logger.error(f"Error analyzing market need: {str(e)}")
-            return False, 0.0, {}
+        return self._analyze_one(MARKET_NEED_TASK, text, '')
     
-    def extract_market_insights(self, posts: List[Dict]) -> Dict:
+    async def analyze_market_need_async(self, text: str) -> Tuple[bool, float, Dict]:
+        """Async variant of analyze_market_need."""
+        return await self._analyze_one_async(MARKET_NEED_TASK, text, '')
+    
+    def analyze_market_need_batch(self, texts: List[str], batch_size: int = 8) -> List[Tuple[bool, float, Dict]]:
+        """
+        Analyze several texts for market needs, packing up to batch_size texts into each request.
+        Returns one (is_need, confidence, details) tuple per text, in input order.
+        """
+        return self._analyze_batch(MARKET_NEED_TASK, texts, '', batch_size)
+    
+    async def analyze_market_need_batch_async(self, texts: List[str], batch_size: int = 8) -> List[Tuple[bool, float, Dict]]:
+        """Async variant of analyze_market_need_batch; batches are sent concurrently."""
+        return await self._analyze_batch_async(MARKET_NEED_TASK, texts, '', batch_size)
+    
+    @staticmethod
+    def _most_relevant(texts: List[str], target_market: str, top_k: int) -> List[str]:
+        """
+        Keep the top_k texts whose embeddings are closest to target_market, in their original order.
+        All texts are kept when there are at most top_k or no embedding model is installed.
+        """
+        if len(texts) <= top_k:
+            return texts
+        embeddings = embed([target_market] + texts, batch_size=64)
+        if embeddings is None:
+            return texts
+        similarities = embeddings[1:] @ embeddings[0]
+        keep = np.sort(np.argpartition(-similarities, top_k)[:top_k])
+        return [texts[i] for i in keep]
+    
+    def extract_market_insights(self, posts: List[Dict], target_market: Optional[str] = None,
+                                top_k: int = 20) -> Dict:
         """
         Analyze multiple posts to extract market insights.
+        With a target_market, only the top_k posts most similar to it (by local sentence
+        embeddings) are sent to the LLM.
         Returns aggregated insights about needs and opportunities.
         """
-        posts_text = "\n\n".join([
+        post_texts = [
             f"Title: {post.get('title', '')}\n"
             f"Content: {post.get('content', '')}\n"
             f"Comments: {post.get('top_comments', '')}"
             for post in posts
-        ])
-        
-        prompt = """Analyze these posts and extract market insights.
-        Return a JSON object with ONLY these fields:
-        {
-            "common_needs": list of strings,
-            "user_segments": list of strings,
-            "pain_points": list of strings,
-            "competition": list of strings,
-            "opportunities": list of strings,
-            "recommendations": list of strings
-        }
+        ]
+        if target_market:
+            post_texts = self._most_relevant(post_texts, target_market, top_k)
+        posts_text = "\n\n".join(post_texts)
         
-        Posts:
-        """ + posts_text
+        prompt = prompts.build_insights_prompt(posts=posts_text)
         
         try:
-            response = self._get_completion(prompt, temperature=0.7)
+            response = self._get_completion(prompt, "insights", temperature=0.7)
             return safe_parse_json(response)
         except Exception as e:
-            logger.error(f"Error extracting market insights: {str(e)}")
+            logger.error("Error extracting market insights: %s", e)
             return {}
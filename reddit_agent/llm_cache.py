@@ -0,0 +1,256 @@
+"""Semantic cache for LLM completions."""
+
+import functools
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # Fuzzy cache lookups are disabled without sentence-transformers
+    SentenceTransformer = None
+
+try:
+    import faiss
+except ImportError:  # Fall back to a NumPy dot product for the similarity search
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODER = "all-MiniLM-L6-v2"
+
+# Embeddings of recently looked-up texts kept per cache, so a miss and the put
+# that follows it encode the text once
+EMBEDDING_MEMO_SIZE = 1024
+
+@functools.lru_cache(maxsize=None)
+def get_encoder(model_name: str = DEFAULT_ENCODER):
+    """Return the shared sentence-transformer model, or None without sentence-transformers."""
+    if SentenceTransformer is None:
+        return None
+    return SentenceTransformer(model_name)
+
+def embed(texts: List[str], model_name: str = DEFAULT_ENCODER, batch_size: int = 32) -> Optional[np.ndarray]:
+    """Embed texts as unit-length float32 rows, or return None without an encoder."""
+    encoder = get_encoder(model_name)
+    if encoder is None:
+        return None
+    return encoder.encode(
+        texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True
+    ).astype(np.float32)
+
+class SemanticCache:
+    """
+    Two-level cache for raw LLM completions backed by SQLite.
+    Entries are scoped by (template_id, context), where context is the subreddit or
+    market the prompt is conditioned on, so similar texts only share a completion
+    when they were asked the same question. Lookups first try an exact SHA-256
+    match on the text, then fall back to a cosine-similarity search over sentence
+    embeddings of earlier texts in the same scope.
+    """
+
+    def __init__(self, db_path: str = "llm_cache.db", threshold: float = 0.92,
+                 model_name: str = DEFAULT_ENCODER):
+        """Open the cache database and create the cache table."""
+        self.db_path = db_path
+        self.threshold = threshold
+        self.model_name = model_name
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._embeddings = OrderedDict()  # text -> (1, dim) embedding, in LRU order
+        self._indexes = {}  # scope -> (index or embedding matrix, list of text hashes)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_completions (
+                text_hash BLOB PRIMARY KEY,
+                scope TEXT,
+                embedding BLOB,
+                response TEXT,
+                hits INTEGER DEFAULT 0,
+                ts TIMESTAMP
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_completions_scope ON llm_completions(scope)")
+        self.conn.commit()
+
+    @property
+    def hits(self) -> int:
+        return self.exact_hits + self.semantic_hits
+
+    @staticmethod
+    def _scope(template_id: str, context: str) -> str:
+        return f"{template_id}\x00{context}"
+
+    @staticmethod
+    def _hash(scope: str, text: str) -> bytes:
+        return hashlib.sha256(f"{scope}\x00{text}".encode("utf-8")).digest()
+
+    def _encode_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Embed texts with the shared encoder in one batch, as (1, dim) rows.
+        Recently embedded texts are reused; all rows are None without an encoder.
+        Runs outside the cache lock, so encoding doesn't hold up other lookups.
+        """
+        with self._lock:
+            missing = [text for text in dict.fromkeys(texts) if text not in self._embeddings]
+        if missing:
+            vectors = embed(missing, self.model_name)
+            if vectors is None:
+                return [None] * len(texts)
+            with self._lock:
+                for i, text in enumerate(missing):
+                    self._embeddings[text] = vectors[i:i + 1]
+        with self._lock:
+            embeddings = []
+            for text in texts:
+                # Texts evicted since they were embedded are simply treated as unembedded
+                embedding = self._embeddings.get(text)
+                if embedding is not None:
+                    self._embeddings.move_to_end(text)
+                embeddings.append(embedding)
+            while len(self._embeddings) > EMBEDDING_MEMO_SIZE:
+                self._embeddings.popitem(last=False)
+        return embeddings
+
+    def _fetch(self, text_hash: bytes) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT response FROM llm_completions WHERE text_hash = ?", (text_hash,)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def _load_index(self, scope: str):
+        """Build the in-memory similarity index for a scope from stored embeddings."""
+        if scope in self._indexes:
+            return self._indexes[scope]
+        rows = self.conn.execute(
+            "SELECT text_hash, embedding FROM llm_completions WHERE scope = ? AND embedding IS NOT NULL",
+            (scope,)
+        ).fetchall()
+        hashes = [row[0] for row in rows]
+        vectors = [np.frombuffer(row[1], dtype=np.float32) for row in rows]
+        matrix = np.vstack(vectors) if vectors else None
+        if faiss is not None and matrix is not None:
+            index = faiss.IndexFlatIP(matrix.shape[1])
+            index.add(matrix)
+        else:
+            index = matrix
+        self._indexes[scope] = (index, hashes)
+        return self._indexes[scope]
+
+    def _search(self, scope: str, embedding: np.ndarray) -> Optional[bytes]:
+        """Return the hash of the most similar cached text above the threshold, if any."""
+        index, hashes = self._load_index(scope)
+        if index is None or not hashes:
+            return None
+        if faiss is not None:
+            scores, ids = index.search(embedding, 1)
+            best, score = int(ids[0][0]), float(scores[0][0])
+        else:
+            similarities = index @ embedding[0]
+            best = int(np.argmax(similarities))
+            score = float(similarities[best])
+        return hashes[best] if best >= 0 and score >= self.threshold else None
+
+    def _add_to_index(self, scope: str, text_hash: bytes, embedding: np.ndarray):
+        index, hashes = self._load_index(scope)
+        if faiss is not None:
+            if index is None:
+                index = faiss.IndexFlatIP(embedding.shape[1])
+            index.add(embedding)
+        else:
+            index = embedding if index is None else np.vstack([index, embedding])
+        hashes.append(text_hash)
+        self._indexes[scope] = (index, hashes)
+
+    def get(self, text: str, template_id: str, context: str = "") -> Optional[str]:
+        """Look up a cached completion by exact match, then by embedding similarity."""
+        return self.get_many([text], template_id, context)[0]
+
+    def get_many(self, texts: List[str], template_id: str, context: str = "") -> List[Optional[str]]:
+        """
+        Look up cached completions for several texts in one scope, None where missing.
+        Texts without an exact match are embedded together in a single batch.
+        """
+        scope = self._scope(template_id, context)
+        hashes = [self._hash(scope, text) for text in texts]
+        with self._lock:
+            responses = [self._fetch(text_hash) for text_hash in hashes]
+        kinds = ["exact" if response is not None else None for response in responses]
+        misses = [i for i, response in enumerate(responses) if response is None]
+        embeddings = self._encode_many([texts[i] for i in misses]) if misses else []
+
+        with self._lock:
+            for i, embedding in zip(misses, embeddings):
+                similar_hash = self._search(scope, embedding) if embedding is not None else None
+                if similar_hash is not None:
+                    responses[i] = self._fetch(similar_hash)
+                    hashes[i] = similar_hash
+                    kinds[i] = "semantic" if responses[i] is not None else None
+
+            for text_hash, kind in zip(hashes, kinds):
+                if kind is None:
+                    self.misses += 1
+                    logger.debug("LLM cache miss for %s (hits=%s, misses=%s)", template_id, self.hits, self.misses)
+                    continue
+                if kind == "exact":
+                    self.exact_hits += 1
+                else:
+                    self.semantic_hits += 1
+                self.conn.execute(
+                    "UPDATE llm_completions SET hits = hits + 1 WHERE text_hash = ?", (text_hash,)
+                )
+                logger.info("LLM cache %s hit for %s (hits=%s, misses=%s)", kind, template_id, self.hits, self.misses)
+            self.conn.commit()
+        return responses
+
+    def put(self, text: str, response: str, template_id: str, context: str = ""):
+        """Store the completion returned for text."""
+        self.put_many([(text, response)], template_id, context)
+
+    def put_many(self, items: List[Tuple[str, str]], template_id: str, context: str = ""):
+        """Store (text, completion) pairs in one scope, embedding the texts in a single batch."""
+        if not items:
+            return
+        scope = self._scope(template_id, context)
+        embeddings = self._encode_many([text for text, _ in items])
+        now = datetime.now().timestamp()
+        rows = [
+            (
+                self._hash(scope, text),
+                scope,
+                embedding.tobytes() if embedding is not None else None,
+                response,
+                now
+            )
+            for (text, response), embedding in zip(items, embeddings)
+        ]
+        with self._lock:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO llm_completions (text_hash, scope, embedding, response, hits, ts)
+                VALUES (?, ?, ?, ?, 0, ?)
+            """, rows)
+            self.conn.commit()
+            for row, embedding in zip(rows, embeddings):
+                if embedding is not None:
+                    self._add_to_index(scope, row[0], embedding)
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters for this session and the number of stored entries."""
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM llm_completions").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'exact_hits': self.exact_hits,
+            'semantic_hits': self.semantic_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+        }
@@ -1,6 +1,14 @@
 """Data models for the Reddit AI Agent."""
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Optional
+import numpy as np
+
+from ._kernels import HAVE_NUMBA, utility_kernel
+
+# Batches smaller than this use plain NumPy; the parallel kernel only pays off
+# (and is only JIT-compiled) for large batches
+KERNEL_MIN_ROWS = 10_000
 
 @dataclass
 class UtilityMetrics:
@@ -9,3 +17,92 @@ class UtilityMetrics:
     sentiment_score: float
     relevance_score: float
     novelty_score: float
+
+def _empty_column() -> np.ndarray:
+    return np.zeros(0, dtype=np.float64)
+
+@dataclass
+class UtilityMetricsBatch:
+    """
+    UtilityMetrics for many submissions, stored as one float64 column per metric.
+    Columns are buffers that grow by doubling; only their first len(batch) rows are valid.
+    """
+    engagement: np.ndarray = field(default_factory=_empty_column)
+    sentiment: np.ndarray = field(default_factory=_empty_column)
+    relevance: np.ndarray = field(default_factory=_empty_column)
+    novelty: np.ndarray = field(default_factory=_empty_column)
+    size: Optional[int] = None  # Defaults to the length of the given columns
+
+    def __post_init__(self):
+        for name in ('engagement', 'sentiment', 'relevance', 'novelty'):
+            setattr(self, name, np.asarray(getattr(self, name), dtype=np.float64))
+        if self.size is None:
+            self.size = len(self.engagement)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, i: int) -> UtilityMetrics:
+        """Return row i as a scalar UtilityMetrics."""
+        if not -self.size <= i < self.size:
+            raise IndexError(f"row {i} out of range for batch of {self.size}")
+        i %= self.size
+        return UtilityMetrics(
+            engagement_rate=float(self.engagement[i]),
+            sentiment_score=float(self.sentiment[i]),
+            relevance_score=float(self.relevance[i]),
+            novelty_score=float(self.novelty[i])
+        )
+
+    def _grow(self):
+        capacity = max(16, 2 * len(self.engagement))
+        for name in ('engagement', 'sentiment', 'relevance', 'novelty'):
+            column = np.zeros(capacity, dtype=np.float64)
+            column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+
+    def append(self, metrics: UtilityMetrics):
+        """Add one submission's metrics as a new row."""
+        if self.size == len(self.engagement):
+            self._grow()
+        i = self.size
+        self.engagement[i] = metrics.engagement_rate
+        self.sentiment[i] = metrics.sentiment_score
+        self.relevance[i] = metrics.relevance_score
+        self.novelty[i] = metrics.novelty_score
+        self.size += 1
+
+    def utility(self, weights: np.ndarray) -> np.ndarray:
+        """
+        Weighted sum of the metrics for every row.
+        weights holds one weight per metric in (engagement, sentiment, relevance, novelty) order.
+        Terms are summed in the same order as RedditAIAgent.calculate_utility, so each
+        row's utility equals the scalar result exactly.
+        """
+        n = self.size
+        we, ws, wr, wn = np.asarray(weights, dtype=np.float64)
+        if HAVE_NUMBA and n >= KERNEL_MIN_ROWS:
+            out = np.empty(n, dtype=np.float64)
+            utility_kernel(self.engagement[:n], self.sentiment[:n], self.relevance[:n], self.novelty[:n],
+                           we, ws, wr, wn, out)
+            return out
+        return (we * self.engagement[:n] + ws * self.sentiment[:n]
+                + wr * self.relevance[:n] + wn * self.novelty[:n])
+
+@dataclass
+class SubredditInfo:
+    """Stored information about a subreddit"""
+    name: str
+    title: str
+    description: str
+    subscribers: int
+    last_updated: float
+
+@dataclass
+class MarketInsight:
+    """Stored market research result for a subreddit"""
+    id: int
+    subreddit_name: str
+    target_market: str
+    created_at: float
+    n_needs: int  # Number of entries in the stored needs_found list
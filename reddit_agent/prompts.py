@@ -0,0 +1,127 @@
+"""Prompt templates for LLM analysis, compiled into builders at import."""
+
+import re
+from typing import Callable, List
+
+def prompt_builder(template: str, *fields: str) -> Callable[..., str]:
+    """
+    Compile a prompt template into a function of its {field} placeholders.
+    The template is split around the placeholders once, so building a prompt only
+    joins the constant pieces with the given values; any other braces (such as a
+    JSON schema) are kept literally and need no escaping.
+    """
+    pieces = re.split(r'\{(' + '|'.join(map(re.escape, fields)) + r')\}', template)
+    head, names, literals = pieces[0], pieces[1::2], pieces[2::2]
+
+    def build(**values: str) -> str:
+        parts = [head]
+        for name, literal in zip(names, literals):
+            parts.append(values[name])
+            parts.append(literal)
+        return ''.join(parts)
+    return build
+
+def numbered(label: str, items: List[str]) -> str:
+    """Number items as '=== <label> i ===' sections for a batched prompt."""
+    return "\n\n".join(f"=== {label} {i} ===\n{item}" for i, item in enumerate(items, start=1))
+
+build_score_prompt = prompt_builder("""Score the following text on three scales from 0 to 1 and extract its main topics:
+        - sentiment: 0 is extremely negative and 1 is extremely positive
+        - relevance: how relevant the text is to {community}, considering its typical content and discussions
+        - novelty: how novel or unique the content is for {community}, considering its common topics and patterns
+        - topics: the main topics of the text, as short phrases
+        Return a JSON object with ONLY these fields:
+        {
+            "sentiment": float between 0 and 1,
+            "relevance": float between 0 and 1,
+            "novelty": float between 0 and 1,
+            "topics": list of strings
+        }
+        
+        Text: {text}""", "community", "text")
+
+build_suggestion_prompt = prompt_builder("""Generate a specific, actionable suggestion for posting in the {subreddit} subreddit
+        based on the following pattern and model data. Be concise and specific.
+        
+        Pattern: {pattern}
+        Model Data: {model_data}""", "subreddit", "pattern", "model_data")
+
+build_relevance_prompt = prompt_builder("""Analyze if this subreddit could potentially contain discussions about product needs, market opportunities, or user feedback related to {target_market}.
+        Even if the connection seems indirect, consider how the community might discuss relevant topics.
+        Return a JSON object with ONLY these fields:
+        {
+            "is_relevant": boolean,
+            "confidence": float between 0 and 1,
+            "reason": string explaining the decision
+        }
+        
+        Target Market: {target_market}
+        Subreddit description: {description}""", "target_market", "description")
+
+build_relevance_batch_prompt = prompt_builder("""Analyze if each of the following {count} subreddits could potentially contain discussions about product needs, market opportunities, or user feedback related to {target_market}.
+        Even if the connection seems indirect, consider how the community might discuss relevant topics.
+        Return a JSON object with ONLY a "results" field holding a list with exactly one entry per subreddit, in the same order:
+        {
+            "results": [
+                {
+                    "subreddit": subreddit number,
+                    "is_relevant": boolean,
+                    "confidence": float between 0 and 1,
+                    "reason": string explaining the decision
+                }
+            ]
+        }
+        
+        Target Market: {target_market}
+        Subreddit descriptions:
+        {descriptions}""", "count", "target_market", "descriptions")
+
+build_market_need_prompt = prompt_builder("""Analyze if this text contains any discussion of problems, needs, requests, or opportunities that could be addressed by products or services.
+        Be inclusive - if there's any hint of a need or opportunity, include it.
+        Return a JSON object with ONLY these fields:
+        {
+            "is_need": boolean,
+            "confidence": float between 0 and 1,
+            "need_type": "product" or "feature" or "service" or "improvement" or "other",
+            "target_market": string describing who would use this,
+            "problem": string describing the problem/need,
+            "current_solutions": string describing existing solutions mentioned,
+            "opportunity": string describing the potential opportunity
+        }
+        
+        Text: {text}""", "text")
+
+build_market_need_batch_prompt = prompt_builder("""Analyze each of the following {count} posts for discussion of problems, needs, requests, or opportunities that could be addressed by products or services.
+        Be inclusive - if there's any hint of a need or opportunity, include it.
+        Return a JSON object with ONLY a "results" field holding a list with exactly one entry per post, in the same order:
+        {
+            "results": [
+                {
+                    "post": post number,
+                    "is_need": boolean,
+                    "confidence": float between 0 and 1,
+                    "need_type": "product" or "feature" or "service" or "improvement" or "other",
+                    "target_market": string describing who would use this,
+                    "problem": string describing the problem/need,
+                    "current_solutions": string describing existing solutions mentioned,
+                    "opportunity": string describing the potential opportunity
+                }
+            ]
+        }
+
+        Posts:
+        {posts}""", "count", "posts")
+
+build_insights_prompt = prompt_builder("""Analyze these posts and extract market insights.
+        Return a JSON object with ONLY these fields:
+        {
+            "common_needs": list of strings,
+            "user_segments": list of strings,
+            "pain_points": list of strings,
+            "competition": list of strings,
+            "opportunities": list of strings,
+            "recommendations": list of strings
+        }
+        
+        Posts:
+        {posts}""", "posts")
@@ -0,0 +1,36 @@
+"""Rate limiting helpers for Reddit API access."""
+
+import asyncio
+import time
+
+class AsyncTokenBucket:
+    """
+    Coroutine-safe token bucket for use within a single event loop.
+    Tokens refill continuously at `rate` per second up to `capacity`; each call
+    to acquire() takes one token, waiting until one is available.
+    """
+
+    def __init__(self, rate: float = 1.0, capacity: int = 60):
+        """Initialize a full bucket."""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self._lock = None  # Created on first use, inside the running event loop
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    async def acquire(self, tokens: int = 1):
+        """Take tokens from the bucket, sleeping until enough have accumulated."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Holding the lock while sleeping hands out tokens to waiters in FIFO order
+        async with self._lock:
+            self._refill()
+            if self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
@@ -8,11 +8,20 @@ setup(
     packages=find_packages(),
     install_requires=[
         "praw",
+        "asyncpraw",
         "pandas",
+        "pyarrow",
         "python-dotenv",
         "numpy",
+        "orjson",
         "groq",  # Added Groq dependency
+        "httpx[http2]",
+        "tenacity",
     ],
+    extras_require={
+        "semantic-cache": ["sentence-transformers", "faiss-cpu"],
+        "jit": ["numba"],
+    },
     author="Your Name",
     author_email="your.email@example.com",
     description="A utility-based learning agent for Reddit analysis",
@@ -24,5 +33,5 @@ setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.7",
+    python_requires=">=3.9",
 )
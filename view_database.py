@@ -1,61 +1,115 @@
 """Script to view database contents."""
 
 import os
-import json
+import shutil
+import sys
+import tempfile
+import orjson
 from datetime import datetime
 from dotenv import load_dotenv
 import sqlite3
-from typing import Dict, List
+from typing import Dict, List, TextIO
+from concurrent.futures import ThreadPoolExecutor
 
-def print_table_contents(db_path: str, table_name: str):
-    """Print all contents of a specified table."""
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        
-        # Get column names
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = [col[1] for col in cursor.fetchall()]
-        print(f"\n=== Contents of {table_name} ===")
-        print("Columns:", ", ".join(columns))
-        
-        # Get all rows
-        cursor.execute(f"SELECT * FROM {table_name}")
-        rows = cursor.fetchall()
-        print(f"Total rows: {len(rows)}")
-        
-        # Print each row
+# Tables we want to examine; table names are interpolated into SQL, so only these are allowed
+TABLES = (
+    "submissions",
+    "learned_patterns",
+    "action_outcomes"
+)
+
+# Table dumps waiting for their turn are kept in memory up to this size, then on disk
+SPOOL_MAX_BYTES = 1 << 20
+
+def connect_readonly(db_path: str) -> sqlite3.Connection:
+    """Open a connection tuned for dumping tables; it refuses any writes."""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA query_only=ON")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-200000")
+    return conn
+
+def _format_row(columns: List[str], row: tuple) -> str:
+    """Render one row as the text block printed for it."""
+    lines = ["\nRow:"]
+    for col, val in zip(columns, row):
+        # Format JSON fields for better readability
+        if isinstance(val, str) and (val.startswith('{') or val.startswith('[')):
+            try:
+                val = orjson.dumps(orjson.loads(val), option=orjson.OPT_INDENT_2).decode()
+            except orjson.JSONDecodeError:
+                pass
+        lines.append(f"  {col}: {val}")
+    lines.append("-" * 50 + "\n")
+    return "\n".join(lines)
+
+def print_table_contents(conn: sqlite3.Connection, table_name: str, out: TextIO = None, chunk_size: int = 1024):
+    """
+    Print all contents of a specified table.
+    Rows are streamed in chunks of chunk_size, so memory use doesn't grow with the table.
+    """
+    if table_name not in TABLES:
+        raise ValueError(f"Unknown table: {table_name}")
+    out = out or sys.stdout
+    
+    total = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    cursor = conn.execute(f"SELECT * FROM {table_name}")
+    
+    # Column names come with the query, even for an empty table
+    columns = [col[0] for col in cursor.description]
+    out.write(f"\n=== Contents of {table_name} ===\n")
+    out.write(f"Columns: {', '.join(columns)}\n")
+    out.write(f"Total rows: {total}\n")
+    
+    # Print each row
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
         for row in rows:
-            print("\nRow:")
-            for col, val in zip(columns, row):
-                # Format JSON fields for better readability
-                if isinstance(val, str) and (val.startswith('{') or val.startswith('[')):
-                    try:
-                        val = json.dumps(json.loads(val), indent=2)
-                    except:
-                        pass
-                print(f"  {col}: {val}")
-            print("-" * 50)
+            out.write(_format_row(columns, row))
+
+def dump_table(db_path: str, table_name: str, out: TextIO):
+    """
+    Write a table's contents to out over a connection of its own,
+    so tables can be dumped from separate threads.
+    """
+    try:
+        conn = connect_readonly(db_path)
+        try:
+            print_table_contents(conn, table_name, out)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        out.write(f"Error reading table {table_name}: {str(e)}\n")
 
 def main():
     """Display contents of the database."""
     db_path = "reddit_memory.db"
     
-    # Tables we want to examine
-    tables = [
-        "submissions",
-        "learned_patterns",
-        "action_outcomes"
-    ]
-    
     print(f"Examining database: {db_path}")
     
     try:
-        # Print contents of each table
-        for table in tables:
-            try:
-                print_table_contents(db_path, table)
-            except sqlite3.Error as e:
-                print(f"Error reading table {table}: {str(e)}")
+        # Dump the tables concurrently, printing each one whole and in order. The first
+        # table streams straight to stdout; the others are spooled to temporary files
+        # and copied out after it, so memory stays bounded. Row formatting holds the
+        # GIL, so the threads mostly overlap SQLite reads rather than formatting.
+        spools = [tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode="w+") for _ in TABLES[1:]]
+        try:
+            with ThreadPoolExecutor(max_workers=len(TABLES)) as executor:
+                first = executor.submit(dump_table, db_path, TABLES[0], sys.stdout)
+                rest = [
+                    executor.submit(dump_table, db_path, table_name, spool)
+                    for table_name, spool in zip(TABLES[1:], spools)
+                ]
+                first.result()
+                for future, spool in zip(rest, spools):
+                    future.result()
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, sys.stdout)
+        finally:
+            for spool in spools:
+                spool.close()
     
     except sqlite3.Error as e:
         print(f"Database error: {str(e)}")